@@ -41,6 +41,7 @@ from ..metrics.transactions import lifetime_value
 from ..mixins import (CartItemSmartListMixin, CouponMixin,
     ProviderMixin, DateRangeContextMixin)
 from ..models import CartItem, Plan, Transaction
+from ..pagination import CreatedAtCursorPagination
 from ..utils import convert_dates_to_utc, get_organization_model
 
 LOGGER = logging.getLogger(__name__)
@@ -323,7 +324,8 @@ class RevenueMetricAPIView(DateRangeContextMixin, ProviderMixin,
 class CouponUsesQuerysetMixin(object):
 
     def get_queryset(self):
-        return CartItem.objects.filter(coupon=self.coupon, recorded=True)
+        return CartItem.objects.filter(coupon=self.coupon,
+            recorded=True).select_related('user', 'plan')
 
 
 class CouponUsesAPIView(CartItemSmartListMixin, CouponUsesQuerysetMixin,
@@ -339,6 +341,11 @@ class CouponUsesAPIView(CartItemSmartListMixin, CouponUsesQuerysetMixin,
     and/or a range of dates ([``start_at``, ``ends_at``]),
     and sorted on specific fields (``o``).
 
+    Passing a ``cursor`` parameter (empty for the first page) switches
+    to cursor pagination. The results are then always sorted by decreasing
+    ``created_at`` (``o`` is ignored) and the response contains ``next``
+    and ``previous`` cursor links but no total ``count``.
+
     **Tags**: metrics, provider, couponmodel
 
     **Examples**
@@ -377,6 +384,19 @@ class CouponUsesAPIView(CartItemSmartListMixin, CouponUsesQuerysetMixin,
     forced_date_range = False
     serializer_class = CartItemSerializer
 
+    @property
+    def paginator(self):
+        # Clients that pass a ``cursor`` query parameter walk through
+        # the uses of a coupon with keyset pagination instead of
+        # page numbers (i.e. LIMIT/OFFSET and COUNT(*)).
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get(
+                    CreatedAtCursorPagination.cursor_query_param) is not None:
+                self._paginator = CreatedAtCursorPagination()
+            else:
+                self._paginator = super(CouponUsesAPIView, self).paginator
+        return self._paginator
+
 
 class CustomerMetricAPIView(DateRangeContextMixin, ProviderMixin,
                             GenericAPIView):
@@ -283,7 +283,8 @@ class CouponSerializer(serializers.ModelSerializer):
         model = Coupon
         fields = ('code', 'discount_type', 'discount_value',
             'created_at', 'ends_at', 'description',
-            'nb_attempts', 'plan')
+            'nb_attempts', 'nb_uses', 'plan')
+        read_only_fields = ('nb_uses',)
 
 
 class CouponCreateSerializer(CouponSerializer):
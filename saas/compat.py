@@ -68,12 +68,15 @@ except ImportError: # django < 3.0
 # The only way to be compatible between Python2 and Python3 is to catch
 # exception in this order.
 try:
-    from django.urls import NoReverseMatch, reverse, reverse_lazy
+    from django.urls import (NoReverseMatch, get_script_prefix, get_urlconf,
+        reverse, reverse_lazy)
 except ImportError: # <= Django 1.10, Python<3.6
-    from django.core.urlresolvers import NoReverseMatch, reverse, reverse_lazy
+    from django.core.urlresolvers import (NoReverseMatch, get_script_prefix,
+        get_urlconf, reverse, reverse_lazy)
 except ModuleNotFoundError: #pylint:disable=undefined-variable
     # <= Django 1.10, Python>=3.6
-    from django.core.urlresolvers import NoReverseMatch, reverse, reverse_lazy
+    from django.core.urlresolvers import (NoReverseMatch, get_script_prefix,
+        get_urlconf, reverse, reverse_lazy)
 
 try:
     from django.urls import include, path, re_path
@@ -0,0 +1,77 @@
+# Copyright (c) 2022, DjaoDjin inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Command to export a balance sheet as a CSV file outside the HTTP
+request/response cycle (ex: from a cron job).
+"""
+
+import io, logging
+
+from django.core.management.base import BaseCommand
+
+from ...compat import six
+from ...views.download import BalancesDownloadView
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Export the balance sheet named *report* as a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at-time', action='store',
+            dest='at_time', default=None,
+            help='Specifies the time at which the balance sheet ends')
+        parser.add_argument('--timezone', action='store',
+            dest='timezone', default=None,
+            help='Specifies the timezone used to compute month boundaries')
+        parser.add_argument('--output', action='store',
+            dest='output', default='-',
+            help='Path of the CSV file to write (default: stdout)')
+        parser.add_argument('report', metavar='report',
+            help="slug of the balance sheet to export")
+
+    def handle(self, *args, **options):
+        view = BalancesDownloadView.for_report(options['report'],
+            ends_at=options['at_time'], timezone=options['timezone'])
+        queryset = view.decorate_queryset(view.get_queryset())
+        output = options['output']
+        LOGGER.info("export balance sheet '%s' to %s",
+            options['report'], output)
+        rows = view.stream_rows(queryset)
+        if six.PY2:
+            # Rows are utf-8 encoded bytes with the Python2 csv module.
+            rows = (row.decode('utf-8') for row in rows)
+        if output == '-':
+            for row in rows:
+                self.stdout.write(row, ending='')
+        else:
+            # ``csv`` expects files opened with ``newline=''`` and balance
+            # line titles may contain non-ascii characters, whatever
+            # the locale.
+            with io.open(output, 'w', encoding='utf-8', newline='') as filedesc:
+                for row in rows:
+                    filedesc.write(row)
@@ -0,0 +1,65 @@
+# Copyright (c) 2022, DjaoDjin inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Command for the cron job. Refreshes the monthly aggregates of transactions
+used to compute balance sheets.
+
+This command should run at least once at the beginning of every month.
+Balances are still exact when it has not run: the months that are not yet
+aggregated are computed from the ``Transaction`` table directly.
+
+The materialized view is created by migration ``0016_monthly_balance_view``
+from the columns of ``saas_transaction``. PostgreSQL refuses to alter
+a column a view depends on, so a later migration that changes
+the ``Transaction`` schema must first drop the view (i.e. run
+``drop_monthly_balance_view``) and re-create it afterwards
+(``create_monthly_balance_view``).
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+from ...metrics.base import MONTHLY_BALANCE_VIEW
+from ...models import Transaction, is_postgresql
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Refresh the monthly aggregates of transactions."
+
+    def handle(self, *args, **options):
+        db_key = router.db_for_write(Transaction)
+        if not is_postgresql(db_key):
+            self.stderr.write("warning: monthly aggregates are only"\
+                " materialized on PostgreSQL databases.")
+            return
+        LOGGER.info("refresh materialized view %s", MONTHLY_BALANCE_VIEW)
+        with connections[db_key].cursor() as cursor:
+            cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" %
+                MONTHLY_BALANCE_VIEW)
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.14 on 2026-10-15 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_coupon_nb_uses(apps, schema_editor):
+    #pylint:disable=unused-argument
+    Coupon = apps.get_model('saas', 'Coupon')
+    CartItem = apps.get_model('saas', 'CartItem')
+    for row in CartItem.objects.filter(recorded=True,
+            coupon__isnull=False).values('coupon').annotate(
+            nb_uses=Count('id')).order_by():
+        Coupon.objects.filter(pk=row['coupon']).update(nb_uses=row['nb_uses'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saas', '0014_v0_9_3'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='nb_uses',
+            field=models.PositiveIntegerField(default=0, help_text='Number of times the coupon was used in a checkout'),
+        ),
+        migrations.RunPython(backfill_coupon_nb_uses,
+            migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['coupon', 'recorded'], name='saas_cartitem_coupon_recorded'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['plan', 'ends_at'], name='saas_subscription_plan_ends'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+MONTHLY_BALANCE_SIDE_SQL = """
+SELECT '%(side)s' AS side,
+  %(side)s_organization_id AS organization_id,
+  %(side)s_account AS account,
+  %(side)s_unit AS unit,
+  date_trunc('month', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+    AS period,
+  SUM(%(side)s_amount) AS amount
+FROM saas_transaction
+WHERE created_at < date_trunc('month', now() AT TIME ZONE 'UTC')
+  AT TIME ZONE 'UTC'
+GROUP BY %(side)s_organization_id, %(side)s_account, %(side)s_unit,
+  date_trunc('month', created_at AT TIME ZONE 'UTC')"""
+
+
+def create_monthly_balance_view(apps, schema_editor):
+    #pylint:disable=unused-argument
+    # Materialized views are only available on PostgreSQL. Other databases
+    # aggregate `saas_transaction` directly.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE MATERIALIZED VIEW saas_monthly_balance AS %s UNION ALL %s" % (
+        MONTHLY_BALANCE_SIDE_SQL % {'side': 'dest'},
+        MONTHLY_BALANCE_SIDE_SQL % {'side': 'orig'}))
+    # A unique index is required to `REFRESH MATERIALIZED VIEW CONCURRENTLY`.
+    schema_editor.execute("CREATE UNIQUE INDEX saas_monthly_balance_uniq"\
+        " ON saas_monthly_balance (side, organization_id, account, unit,"\
+        " period)")
+
+
+def drop_monthly_balance_view(apps, schema_editor):
+    #pylint:disable=unused-argument
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP MATERIALIZED VIEW saas_monthly_balance")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saas', '0015_v0_12_0'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_monthly_balance_view,
+            drop_monthly_balance_view),
+    ]
@@ -68,9 +68,9 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import (DatabaseError, IntegrityError, connections, models,
     transaction)
-from django.db.models import Max, Q, Sum
+from django.db.models import F, Max, Q, Sum
 from django.db.models.query import QuerySet
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.db.utils import DEFAULT_DB_ALIAS
 from django.dispatch import receiver
 from django.template.defaultfilters import slugify
@@ -781,6 +781,9 @@ class Organization(models.Model):
                 if cart_item:
                     cart_item.recorded = True
                     cart_item.save()
+                    if cart_item.coupon_id:
+                        Coupon.objects.filter(pk=cart_item.coupon_id).update(
+                            nb_uses=F('nb_uses') + 1)
 
         # At this point we have gathered all the ``Organization``
         # which have yet to be registered. For these no ``Subscription``
@@ -2937,6 +2940,8 @@ class Coupon(models.Model):
         " (in ISO format)"))
     nb_attempts = models.IntegerField(null=True, blank=True,
         help_text=_("Number of times the coupon can be used"))
+    nb_uses = models.PositiveIntegerField(default=0,
+        help_text=_("Number of times the coupon was used in a checkout"))
     extra = get_extra_field_class()(null=True,
         help_text=_("Extra meta data (can be stringify JSON)"))
 
@@ -3142,6 +3147,12 @@ class CartItem(models.Model):
             " the subscription (GroupBuy)"))
     claim_code = models.SlugField(db_index=True, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['coupon', 'recorded'],
+                name='saas_cartitem_coupon_recorded'),
+        ]
+
     def __str__(self):
         return '%s-%s' % (self.user, self.plan)
 
@@ -3163,6 +3174,14 @@ class CartItem(models.Model):
         return result
 
 
+@receiver(post_delete, sender=CartItem)
+def on_cart_item_post_delete(sender, instance, **kwargs):
+    #pylint:disable=unused-argument
+    if instance.recorded and instance.coupon_id:
+        Coupon.objects.filter(pk=instance.coupon_id, nb_uses__gt=0).update(
+            nb_uses=F('nb_uses') - 1)
+
+
 class SubscriptionQuerySet(models.QuerySet):
 
     def active_with(self, provider, ends_at=None, **kwargs):
@@ -3312,6 +3331,12 @@ class Subscription(models.Model):
     extra = get_extra_field_class()(null=True,
         help_text=_("Extra meta data (can be stringify JSON)"))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['plan', 'ends_at'],
+                name='saas_subscription_plan_ends'),
+        ]
+
     def __str__(self):
         return '%s%s%s' % (str(self.organization), Subscription.SEP,
             str(self.plan))
@@ -4500,6 +4525,12 @@ def is_sqlite3(db_key=None):
     return connections.databases[db_key]['ENGINE'].endswith('sqlite3')
 
 
+def is_postgresql(db_key=None):
+    if db_key is None:
+        db_key = DEFAULT_DB_ALIAS
+    return connections[db_key].vendor == 'postgresql'
+
+
 def get_period_usage(subscription, use_charge, starts_at, ends_at):
     return Transaction.objects.filter(
         orig_account=Transaction.RECEIVABLE,
@@ -24,7 +24,7 @@
 
 from collections import OrderedDict
 
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 from . import settings
@@ -116,6 +116,22 @@ class BalancePagination(PageNumberPagination):
         }
 
 
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on ``created_at``. The cost of fetching a page does not
+    depend on how deep the page is in the list, and no total count of records
+    is computed.
+    """
+    ordering = ('-created_at',)
+
+    def get_ordering(self, request, queryset, view):
+        # The cursor encodes a position in the ``created_at`` ordering only,
+        # so we ignore the ordering requested through ``OrderingFilter``
+        # (i.e. the ``o`` query parameter) which would otherwise break
+        # the pages apart.
+        return self.ordering
+
+
 class RoleListPagination(PageNumberPagination):
 
     def get_paginated_response(self, data):
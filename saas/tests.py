@@ -22,9 +22,22 @@
 # OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
 # ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import gzip
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-from .metrics.base import month_periods
+from .api.metrics import CouponUsesAPIView
+from .metrics import base as metrics_base
+from .metrics.base import (month_periods, monthly_balances,
+    monthly_balances_by_like_account)
+from .models import (BalanceLine, CartItem, Coupon, Organization, Plan,
+    Subscription, Transaction)
+from .utils import datetime_or_now
+from .views.download import BalancesDownloadView, gzip_stream
 
 
 class SaasTests(TestCase):
@@ -119,3 +132,194 @@ class SaasTests(TestCase):
             '2018-03-01 00:00:00-05:00',
             '2018-04-01 00:00:00-04:00',
             '2018-04-18 00:00:00-04:00'])
+
+
+    def test_gzip_stream(self):
+        """
+        Test streamed CSV rows are compressed into a valid gzip file
+        """
+        rows = ['row-%d,2018-04-18\r\n' % idx for idx in range(10000)]
+        compressed = b''.join(gzip_stream(rows, block_size=1024))
+        self.assertEqual(gzip.decompress(compressed).decode('utf-8'),
+            ''.join(rows))
+
+
+    @staticmethod
+    def _walk_coupon_uses(query):
+        """
+        Returns the pk of the cart items found walking through all pages
+        of ``CouponUsesAPIView`` in cursor mode.
+        """
+        results = []
+        url = '/?%s' % query
+        while url:
+            view = CouponUsesAPIView()
+            view.request = Request(APIRequestFactory().get(url))
+            view.format_kwarg = None
+            view.paginator.page_size = 2
+            page = view.paginate_queryset(
+                view.filter_queryset(CartItem.objects.all()))
+            results += [cart_item.pk for cart_item in page]
+            url = view.paginator.get_next_link()
+        return results
+
+
+    def test_coupon_uses_cursor_ignores_ordering(self):
+        """
+        Test cursor pages of coupon uses are sorted by decreasing
+        ``created_at`` whether or not ``o`` is passed
+        """
+        created_at = datetime_or_now() - timedelta(days=10)
+        expected = []
+        for idx in range(5):
+            user = get_user_model().objects.create(username='user%d' % idx)
+            cart_item = CartItem.objects.create(user=user, recorded=True)
+            CartItem.objects.filter(pk=cart_item.pk).update(
+                created_at=created_at + timedelta(days=idx))
+            expected = [cart_item.pk] + expected
+        self.assertEqual(self._walk_coupon_uses('cursor='), expected)
+        self.assertEqual(
+            self._walk_coupon_uses('cursor=&o=created_at'), expected)
+
+
+    def test_sum_amounts_materialized_split(self):
+        """
+        Test complete months are read from the materialized view
+        and only later transactions are aggregated on the fly
+        """
+        #pylint:disable=protected-access
+        provider = Organization.objects.create(slug='provider')
+        for created_at, account, amount in (
+                # Already aggregated in the materialized view.
+                ("2018-02-15T00:00:00+00:00", Transaction.FUNDS, 1000),
+                ("2018-03-15T00:00:00+00:00", Transaction.FUNDS, 10),
+                ("2018-04-05T00:00:00+00:00", Transaction.INCOME, 3),
+                ("2018-04-10T00:00:00+00:00", Transaction.FUNDS, 5),
+                ("2018-04-20T00:00:00+00:00", Transaction.FUNDS, 7)):
+            Transaction.objects.create(
+                created_at=datetime_or_now(created_at),
+                dest_account=account, dest_amount=amount, dest_unit='usd',
+                dest_organization=provider, orig_organization=provider)
+        periods = [datetime_or_now(period) for period in (
+            "2018-02-01T00:00:00+00:00",
+            "2018-03-01T00:00:00+00:00",
+            "2018-04-01T00:00:00+00:00",
+            "2018-04-18T00:00:00+00:00")]
+        month_starts = []
+
+        def materialized_amounts_by_account(side, date_periods,
+                                            organization=None):
+            #pylint:disable=unused-argument
+            month_starts.extend(date_periods)
+            return {(Transaction.FUNDS, 'usd'): [100, 1100, 1100, 1100]}
+
+        saved = metrics_base._materialized_amounts_by_account
+        metrics_base._materialized_amounts_by_account \
+            = materialized_amounts_by_account
+        try:
+            results = metrics_base._sum_amounts_by_account('dest', periods,
+                materialized_until=datetime_or_now(
+                    "2018-03-01T00:00:00+00:00"))
+        finally:
+            metrics_base._materialized_amounts_by_account = saved
+        self.assertEqual([str(month_start) for month_start in month_starts], [
+            '2018-02-01 00:00:00+00:00',
+            '2018-03-01 00:00:00+00:00',
+            '2018-03-01 00:00:00+00:00',
+            '2018-03-01 00:00:00+00:00'])
+        self.assertEqual(results, {
+            (Transaction.FUNDS, 'usd'): [100, 1100, 1110, 1115],
+            (Transaction.INCOME, 'usd'): [0, 0, 0, 3]})
+
+
+    @staticmethod
+    def _create_ledger():
+        provider = Organization.objects.create(slug='provider')
+        for created_at, orig_account, dest_account, amount, unit in (
+                ("2018-01-10T00:00:00+00:00", Transaction.INCOME,
+                 Transaction.FUNDS, 1000, 'usd'),
+                # End of February in US/Eastern, March in UTC.
+                ("2018-02-28T23:30:00-05:00", Transaction.INCOME,
+                 Transaction.FUNDS, 500, 'usd'),
+                ("2018-03-15T00:00:00+00:00", Transaction.RECEIVABLE,
+                 Transaction.BACKLOG, 200, 'eur'),
+                ("2018-04-10T00:00:00+00:00", Transaction.BACKLOG,
+                 Transaction.RECEIVABLE, 50, 'eur'),
+                # After the end of the last period.
+                ("2018-04-20T00:00:00+00:00", Transaction.INCOME,
+                 Transaction.FUNDS, 70, 'usd')):
+            Transaction.objects.create(
+                created_at=datetime_or_now(created_at),
+                orig_account=orig_account, orig_amount=amount, orig_unit=unit,
+                orig_organization=provider,
+                dest_account=dest_account, dest_amount=amount, dest_unit=unit,
+                dest_organization=provider)
+
+
+    def test_monthly_balances_by_like_account(self):
+        """
+        Test balances computed for many selectors at once are the same
+        as the balances computed one selector at a time
+        """
+        self._create_ledger()
+        # 'Fund' and 'Funds' overlap, 'n' matches both Funds and Income.
+        like_accounts = ['Funds', 'fund', 'In', 'n', 'Backlog', 'able']
+        until = "2018-04-18T00:00:00+00:00"
+        for timezone in (None, 'US/Eastern'):
+            results = monthly_balances_by_like_account(set(like_accounts),
+                month_periods(from_date=until, tz=timezone))
+            for like_account in like_accounts:
+                self.assertEqual(results[like_account],
+                    monthly_balances(like_account=like_account,
+                        until=until, tz=timezone))
+
+
+    def test_balances_download_is_positive(self):
+        """
+        Test balance lines marked ``is_positive`` are exported
+        as absolute values
+        """
+        self._create_ledger()
+        BalanceLine.objects.create(report='balances', title='Assets',
+            selector='', rank=0)
+        BalanceLine.objects.create(report='balances', title='Income',
+            selector=Transaction.INCOME, is_positive=True, rank=1)
+        BalanceLine.objects.create(report='balances', title='Funds',
+            selector=Transaction.FUNDS, rank=2)
+        until = "2018-04-18T00:00:00+00:00"
+        view = BalancesDownloadView.for_report('balances', ends_at=until)
+        rows = [view.queryrow_to_columns(balance_line)
+            for balance_line in view.decorate_queryset(view.get_queryset())]
+        income, _ = monthly_balances(
+            like_account=Transaction.INCOME, until=until)
+        funds, _ = monthly_balances(
+            like_account=Transaction.FUNDS, until=until)
+        self.assertTrue(any(amount < 0 for _, amount in income))
+        self.assertEqual(rows, [
+            ['Assets'],
+            ['Income'] + [abs(amount) for _, amount in income],
+            ['Funds'] + [amount for _, amount in funds]])
+
+
+    def test_coupon_nb_uses(self):
+        """
+        Test ``Coupon.nb_uses`` counts the cart items recorded
+        with the coupon at checkout
+        """
+        provider = Organization.objects.create(slug='provider',
+            is_provider=True)
+        subscriber = Organization.objects.create(slug='subscriber')
+        user = get_user_model().objects.create(username='alice')
+        plan = Plan.objects.create(slug='basic', organization=provider)
+        coupon = Coupon.objects.create(code='DIS100', organization=provider)
+        cart_item = CartItem.objects.create(
+            user=user, plan=plan, coupon=coupon)
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).nb_uses, 0)
+        subscriber.execute_order([{
+            'subscription': Subscription(organization=subscriber, plan=plan,
+                ends_at=datetime_or_now()),
+            'lines': []}], user)
+        self.assertTrue(CartItem.objects.get(pk=cart_item.pk).recorded)
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).nb_uses, 1)
+        CartItem.objects.get(pk=cart_item.pk).delete()
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).nb_uses, 0)
@@ -28,11 +28,11 @@ CSV download view basics.
 
 from __future__ import unicode_literals
 
-import csv
+import csv, re, zlib
 from decimal import Decimal
-from io import BytesIO, StringIO
 
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.template.defaultfilters import slugify
 from django.views.generic import View
 from rest_framework.generics import get_object_or_404
@@ -44,8 +44,7 @@ from ..api.transactions import (BillingsQuerysetMixin,
     SmartTransactionListMixin, TransactionQuerysetMixin, TransferQuerysetMixin)
 from ..api.users import RegisteredQuerysetMixin
 from ..compat import six
-from ..metrics.base import (abs_monthly_balances, monthly_balances,
-    month_periods)
+from ..metrics.base import monthly_balances_by_like_account, month_periods
 from ..mixins import (CartItemSmartListMixin, ProviderMixin,
     MetricsMixin, ChurnedQuerysetMixin, SubscriptionSmartListMixin,
     SubscribedQuerysetMixin, UserSmartListMixin, as_html_description)
@@ -53,10 +52,54 @@ from ..models import BalanceLine, CartItem, Coupon
 from ..utils import datetime_or_now
 
 
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def gzip_stream(chunks, level=1, block_size=65536):
+    """
+    Compresses the sequence of *chunks* in gzip format, yielding compressed
+    data every time at least *block_size* bytes of input were consumed.
+
+    The default compression *level* favors speed since CSV files compress
+    well even at low levels.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    block = []
+    block_len = 0
+    for chunk in chunks:
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf-8')
+        block += [chunk]
+        block_len += len(chunk)
+        if block_len >= block_size:
+            compressed = compressor.compress(b''.join(block))
+            if compressed:
+                yield compressed
+            block = []
+            block_len = 0
+    yield compressor.compress(b''.join(block)) + compressor.flush()
+
+
+class PseudoBuffer(object):
+    """
+    An object that implements just the write method of the file-like
+    interface, such that ``csv.writer`` returns the formatted row instead
+    of buffering it.
+    """
+
+    @staticmethod
+    def write(value):
+        return value
+
+
 class CSVDownloadView(View):
 
     basename = 'download'
     headings = []
+    # Number of rows fetched at a time from the database server-side cursor.
+    chunk_size = 2000
+    # Compress the response when the client accepts gzip content encoding.
+    gzip_content = True
 
     @staticmethod
     def encode(text):
@@ -84,23 +127,48 @@ class CSVDownloadView(View):
         return queryset
 
     def get(self, *args, **kwargs): #pylint: disable=unused-argument
-        if six.PY2:
-            content = BytesIO()
+        # The queryset is built before the response is returned such that
+        # errors (ex: 404) are raised before we start streaming content.
+        queryset = self.decorate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        if self.gzip_content and ACCEPTS_GZIP_RE.search(
+                self.request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            resp = StreamingHttpResponse(
+                gzip_stream(self.stream_rows(queryset)),
+                content_type='text/csv; charset=utf-8')
+            resp['Content-Encoding'] = 'gzip'
         else:
-            content = StringIO()
-        csv_writer = csv.writer(content)
-        csv_writer.writerow([self.encode(head)
-            for head in self.get_headings()])
-        qs = self.decorate_queryset(self.filter_queryset(self.get_queryset()))
-        for record in qs:
-            csv_writer.writerow(self.queryrow_to_columns(record))
-        content.seek(0)
-        resp = HttpResponse(content, content_type='text/csv')
+            resp = StreamingHttpResponse(
+                self.stream_rows(queryset),
+                content_type='text/csv; charset=utf-8')
+        patch_vary_headers(resp, ('Accept-Encoding',))
         resp['Content-Disposition'] = \
             'attachment; filename="{}"'.format(
                 self.get_filename())
         return resp
 
+    def iterate_queryset(self, queryset):
+        if not hasattr(queryset, 'iterator'):
+            # `decorate_queryset` might have already evaluated the queryset
+            # into a list.
+            return queryset
+        try:
+            return queryset.iterator(chunk_size=self.chunk_size)
+        except TypeError: # Django < 2.0
+            return queryset.iterator()
+
+    def stream_rows(self, queryset):
+        csv_writer = csv.writer(PseudoBuffer())
+        yield csv_writer.writerow([self.encode(head)
+            for head in self.get_headings()])
+        for record in self.iterate_queryset(queryset):
+            row = self.queryrow_to_columns(record)
+            if six.PY2:
+                # The Python2 csv module only deals with bytes.
+                row = [self.encode(col) if isinstance(col, six.text_type)
+                    else col for col in row]
+            yield csv_writer.writerow(row)
+
     def get_headings(self):
         return self.headings
 
@@ -109,8 +177,12 @@ class CSVDownloadView(View):
         # Searchable and SortableListMixin in "extra_views"
         raise NotImplementedError
 
+    def get_basename(self):
+        return self.basename
+
     def get_filename(self):
-        return datetime_or_now().strftime(self.basename + '-%Y%m%d.csv')
+        return '{}-{}.csv'.format(
+            self.get_basename(), datetime_or_now().strftime('%Y%m%d'))
 
     def queryrow_to_columns(self, record):
         raise NotImplementedError
@@ -122,24 +194,50 @@ class BalancesDownloadView(MetricsMixin, CSVDownloadView):
     """
     queryname = 'balances'
 
+    @classmethod
+    def for_report(cls, report, ends_at=None, timezone=None):
+        """
+        Returns a view that exports the balance sheet *report* ending
+        at *ends_at* in *timezone*, outside an HTTP request/response
+        cycle (ex: from a management command).
+        """
+        view = cls(args=[], kwargs={'report': report})
+        view._ends_at = datetime_or_now(ends_at)
+        view._timezone = timezone
+        return view
+
+    @property
+    def periods(self):
+        if not hasattr(self, '_periods'):
+            self._periods = month_periods(
+                from_date=self.ends_at, tz=self.timezone)
+        return self._periods
+
     def get_headings(self):
-        return ['Title'] + [str(end_period) for end_period in month_periods(
-            from_date=self.ends_at, tz=self.timezone)]
+        return ['Title'] + [str(end_period) for end_period in self.periods]
 
     def get_queryset(self):
         report = self.kwargs.get('report')
         return BalanceLine.objects.filter(report=report).order_by('rank')
 
+    def decorate_queryset(self, queryset):
+        decorated_queryset = list(queryset)
+        # Balances for all lines are computed at once instead of running
+        # aggregate queries over ``Transaction`` for each line.
+        self._balances = monthly_balances_by_like_account(
+            set([balance_line.selector for balance_line in decorated_queryset
+                if balance_line.selector]), self.periods)
+        return decorated_queryset
+
     def queryrow_to_columns(self, record):
         balance_line = record
-        if balance_line.is_positive:
-            balances_func = abs_monthly_balances
-        else:
-            balances_func = monthly_balances
         if balance_line.selector:
-            balances, _ = balances_func(
-                like_account=balance_line.selector, until=self.ends_at)
-            row = [balance_line.title] + [item[1] for item in balances]
+            balances, _ = self._balances[balance_line.selector]
+            if balance_line.is_positive:
+                row = [balance_line.title] + [
+                    abs(item[1]) for item in balances]
+            else:
+                row = [balance_line.title] + [item[1] for item in balances]
         else:
             # means we have a heading only
             row = [balance_line.title]
@@ -149,6 +247,7 @@ class BalancesDownloadView(MetricsMixin, CSVDownloadView):
 class CouponDownloadView(SmartCouponListMixin, CouponQuerysetMixin,
                          CSVDownloadView):
 
+    basename = 'coupons'
     headings = [
         'Created At'
         'Code',
@@ -159,9 +258,6 @@ class CouponDownloadView(SmartCouponListMixin, CouponQuerysetMixin,
     def get_headings(self):
         return self.headings
 
-    def get_filename(self):
-        return datetime_or_now().strftime('coupons-%Y%m%d.csv')
-
     def queryrow_to_columns(self, record):
         row = [
             record.created_at.date(),
@@ -218,17 +314,16 @@ class CartItemDownloadView(CartItemSmartListMixin, CartItemQuerysetMixin,
     def get_headings(self):
         return self.headings
 
-    def get_filename(self):
-        filename_tpl = ((self.coupon_code if self.coupon_code else 'coupons')
-            + '-%Y%m%d.csv')
-        return datetime_or_now().strftime(filename_tpl)
+    def get_basename(self):
+        return self.coupon_code if self.coupon_code else 'coupons'
 
     def get_queryset(self):
         '''
         Return CartItems related to the Coupon specified in the URL.
         '''
         return super(CartItemDownloadView, self).get_queryset().filter(
-            coupon__in=self.get_coupons())
+            coupon__in=self.get_coupons()).select_related(
+            'coupon', 'user', 'plan')
 
     def queryrow_to_columns(self, record):
         cartitem = record
@@ -243,31 +338,38 @@ class CartItemDownloadView(CartItemSmartListMixin, CartItemQuerysetMixin,
             email = cartitem.sync_on
         return [
             cartitem.created_at.date(),
-            self.encode(cartitem.coupon.code),
+            cartitem.coupon.code,
             slugify(
                 Coupon.DISCOUNT_CHOICES[cartitem.coupon.discount_type - 1][1]),
             cartitem.coupon.discount_value,
-            self.encode(full_name),
-            self.encode(email),
-            self.encode(cartitem.plan.slug),
-            self.encode(claim_code)]
+            full_name,
+            email,
+            cartitem.plan.slug,
+            claim_code]
 
 
 class RegisteredBaseDownloadView(RegisteredQuerysetMixin, CSVDownloadView):
 
+    basename = 'registered'
+
     def get_headings(self):
         return ['First name', 'Last name', 'Email', 'Registration Date']
 
-    def get_filename(self):
-        return 'registered-{}.csv'.format(datetime_or_now().strftime('%Y%m%d'))
+    @staticmethod
+    def decorate_queryset(queryset):
+        # Rows are read as plain dictionaries since we only need a few
+        # columns. The primary key is kept such that the `distinct`
+        # in the queryset still applies per user.
+        return queryset.values(
+            'pk', 'first_name', 'last_name', 'email', 'date_joined')
 
     def queryrow_to_columns(self, record):
         user = record
         return [
-            self.encode(user.first_name),
-            self.encode(user.last_name),
-            self.encode(user.email),
-            user.date_joined.date(),
+            user['first_name'],
+            user['last_name'],
+            user['email'],
+            user['date_joined'].date(),
         ]
 
 
@@ -280,24 +382,32 @@ class SubscriptionBaseDownloadView(CSVDownloadView):
 
     subscriber_type = None
 
+    @staticmethod
+    def decorate_queryset(queryset):
+        # Only the columns written in the CSV file are loaded, as plain
+        # dictionaries, and profiles and plans are joined in the same query
+        # instead of being fetched row by row.
+        return queryset.values(
+            'organization__full_name', 'organization__email', 'plan__title',
+            'created_at', 'ends_at')
+
     def get_queryset(self):
         raise NotImplementedError()
 
     def get_headings(self):
         return ['Name', 'Email', 'Plan', 'Since', 'Until']
 
-    def get_filename(self):
-        return 'subscribers-{}-{}.csv'.format(
-            self.subscriber_type, datetime_or_now().strftime('%Y%m%d'))
+    def get_basename(self):
+        return 'subscribers-{}'.format(self.subscriber_type)
 
     def queryrow_to_columns(self, record):
         subscription = record
         return [
-            self.encode(subscription.organization.full_name),
-            self.encode(subscription.organization.email),
-            self.encode(subscription.plan.title),
-            subscription.created_at.date(),
-            subscription.ends_at.date(),
+            subscription['organization__full_name'],
+            subscription['organization__email'],
+            subscription['plan__title'],
+            subscription['created_at'].date(),
+            subscription['ends_at'].date(),
         ]
 
 
@@ -26,17 +26,53 @@ import json
 from datetime import datetime
 
 from dateutil.relativedelta import relativedelta
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.translation import get_language
 from django.views.generic import TemplateView
 
 from .download import CSVDownloadView
 from .. import settings
 from ..api.metrics import LifetimeValueMetricMixin
-from ..compat import reverse
+from ..compat import get_script_prefix, get_urlconf, reverse
 from ..mixins import CouponMixin, ProviderMixin, MetricsMixin
 from ..models import CartItem, Plan
 from ..utils import datetime_or_now, update_context_urls
 
 
+# Resolved URLs keyed by ``(url_name, profile_slug, script_prefix, urlconf,
+# language)``. `script_prefix` and `language` are part of the key because
+# `reverse` prepends them (the latter through `i18n_patterns`) to the path
+# it returns.
+_REVERSE_CACHE = {}
+_REVERSE_CACHE_MAXSIZE = 128
+
+
+@receiver(setting_changed)
+def _clear_reverse_cache(**kwargs):
+    #pylint:disable=unused-argument
+    # Tests overriding ``ROOT_URLCONF`` (or any setting the URLs depend on)
+    # must not see URLs resolved against the previous configuration.
+    _REVERSE_CACHE.clear()
+
+
+def reverse_for_profile(url_name, profile):
+    """
+    Returns the URL for *url_name* for a *profile*, memoizing
+    the URL resolution for subsequent requests.
+    """
+    urlconf = get_urlconf()
+    key = (url_name, str(profile), get_script_prefix(), urlconf,
+        get_language())
+    url = _REVERSE_CACHE.get(key)
+    if url is None:
+        if len(_REVERSE_CACHE) >= _REVERSE_CACHE_MAXSIZE:
+            _REVERSE_CACHE.clear()
+        url = reverse(url_name, args=(key[1],), urlconf=urlconf)
+        _REVERSE_CACHE[key] = url
+    return url
+
+
 class SubscribersActivityView(ProviderMixin, TemplateView):
 
     template_name = 'saas/metrics/activity.html'
@@ -194,25 +230,30 @@ class PlansMetricsView(ProviderMixin, TemplateView):
 
     Template context:
       - ``organization`` The provider object
+      - ``plans`` The plans of the provider
       - ``request`` The HTTP request object
     """
 
     template_name = 'saas/metrics/plans.html'
 
+    # Only the API end point changes with the provider, so the JSON is
+    # serialized once and filled in on each request (see RevenueMetricsView).
+    _TABLES_TEMPLATE = json.dumps([
+        {"title": "Active subscribers",
+         "key": "plan",
+         "active": True,
+         "location": "%(api_metrics_plans)s"}])
+
     def get_context_data(self, **kwargs):
         context = super(PlansMetricsView, self).get_context_data(**kwargs)
         context.update({
             "title": "Plans",
-            "tables" : json.dumps([{
-                "title": "Active subscribers",
-                "key": "plan",
-                "active": True,
-                "location": reverse(
-                    'saas_api_metrics_plans', args=(self.provider,))},
-            ]),
+            "tables" : self._TABLES_TEMPLATE % {
+                'api_metrics_plans': reverse_for_profile(
+                    'saas_api_metrics_plans', self.provider)},
             "plans": Plan.objects.filter(organization=self.provider)})
         urls_provider = {
-            'plan_new': reverse('saas_plan_new', args=(self.provider,))}
+            'plan_new': reverse_for_profile('saas_plan_new', self.provider)}
         if 'urls' in context:
             if 'provider' in context['urls']:
                 context['urls']['provider'].update(urls_provider)
@@ -251,6 +292,24 @@ class RevenueMetricsView(MetricsMixin, TemplateView):
 
     template_name = 'saas/metrics/revenue.html'
 
+    # The tables are the same for all providers except for the currency unit
+    # and API end points, so the JSON is serialized once and filled in with
+    # plain string substitution on each request. ``unit`` is a three-letter
+    # ISO 4217 code and reversed URLs are already IRI-escaped, so neither
+    # requires further JSON escaping.
+    _TABLES_TEMPLATE = json.dumps([
+        {"key": "cash",
+         "title": "Amounts",
+         "unit": "%(unit)s",
+         "location": "%(api_revenue)s"},
+        {"key": "customer",
+         "title": "Customers",
+         "location": "%(api_customer)s"},
+        {"key": "balances",
+         "title": "Balances",
+         "unit": "%(unit)s",
+         "location": "%(api_balances)s"}])
+
     def get_context_data(self, **kwargs):
         context = super(RevenueMetricsView, self).get_context_data(**kwargs)
         unit = settings.DEFAULT_UNIT
@@ -259,19 +318,12 @@ class RevenueMetricsView(MetricsMixin, TemplateView):
             unit = a_receivable.orig_unit
         context.update({
             "title": "Sales",
-            "tables": json.dumps(
-                [{"key": "cash",
-                        "title": "Amounts",
-                        "unit": unit,
-                        "location": reverse('saas_api_revenue',
-                            args=(self.organization,))},
-                       {"key": "customer",
-                        "title": "Customers",
-                        "location": reverse('saas_api_customer',
-                            args=(self.organization,))},
-                       {"key": "balances",
-                        "title": "Balances",
-                        "unit": unit,
-                        "location": reverse('saas_api_balances',
-                            args=(self.organization,))}])})
+            "tables": self._TABLES_TEMPLATE % {
+                'unit': unit,
+                'api_revenue': reverse_for_profile(
+                    'saas_api_revenue', self.organization),
+                'api_customer': reverse_for_profile(
+                    'saas_api_customer', self.organization),
+                'api_balances': reverse_for_profile(
+                    'saas_api_balances', self.organization)}})
         return context